@@ -1,13 +1,35 @@
 from . import instruments
 from . import tasks
+import importlib
 import sys
 
+# Convenience names for notebooks, imported on first access
+_lazy_imports = {
+    'plt': ('matplotlib.pyplot', None),
+    'display': ('IPython.display', 'display'),
+    'clear_output': ('IPython.display', 'clear_output'),
+    'np': ('numpy', None),
+    'math': ('math', None),
+    'time': ('time', None),
+    'pandas': ('pandas', None),
+}
+
+__all__ = ['instruments', 'tasks', 'enable_notebook']
 if 'ipykernel' in sys.modules:
-    from matplotlib import pyplot as plt
-    from IPython.display import display, clear_output
-    import numpy as np
-    import math
-    import time
-    import pandas
+    __all__ += list(_lazy_imports)
+
+def __getattr__(name):
+    if name not in _lazy_imports:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    module, attr = _lazy_imports[name]
+    value = importlib.import_module(module)
+    if attr:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+def enable_notebook():
+    '''Enable interactive mpld3 plots in Jupyter notebook.'''
     import mpld3
     mpld3.enable_notebook()
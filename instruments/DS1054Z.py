@@ -11,10 +11,61 @@ import PIL.Image
 import io
 import socket
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+if numba:
+    @numba.njit(cache = True, fastmath = True, parallel = True)
+    def _goertzel_blocks(data, w, blocklen, re, im):
+        '''Run Goertzel filter over blocks of data in parallel.
+        Stores sum(data[n] * exp(-j*w*n)) for each block in re and im.'''
+        c = 2.0 * math.cos(w)
+        for k in numba.prange(re.shape[0]):
+            start = k * blocklen
+            end = min(start + blocklen, data.shape[0])
+            s1 = 0.0
+            s2 = 0.0
+            for n in range(start, end):
+                s0 = data[n] + c * s1 - s2
+                s2 = s1
+                s1 = s0
+            
+            # Rotate the filter output back to the absolute sample position
+            yr = s1 - math.cos(w) * s2
+            yi = math.sin(w) * s2
+            ph = -w * (end - 1)
+            re[k] = yr * math.cos(ph) - yi * math.sin(ph)
+            im[k] = yr * math.sin(ph) + yi * math.cos(ph)
+
+def _dft_bin(data, periods):
+    '''Calculate sum(data * exp(j * tau * periods * n / len(data))).
+    Uses a Numba-compiled Goertzel filter when available, otherwise rfft().'''
+    if numba:
+        data = numpy.ascontiguousarray(data)
+        blocklen = 65536
+        blocks = max(1, math.ceil(len(data) / blocklen))
+        re = numpy.zeros(blocks)
+        im = numpy.zeros(blocks)
+        _goertzel_blocks(data, math.tau * periods / len(data), blocklen, re, im)
+        return complex(numpy.sum(re), -numpy.sum(im))
+    else:
+        # Only a single bin is needed, but rfft() is still much cheaper than
+        # building the complex exponential for the whole buffer.
+        return numpy.conj(numpy.fft.rfft(data)[periods])
+
+def _nearest(table, value):
+    '''Return the entry of a sorted table that is closest to value.'''
+    i = numpy.searchsorted(table, value)
+    lower = table[max(i - 1, 0)]
+    upper = table[min(i, len(table) - 1)]
+    return float(lower if abs(value - lower) <= abs(upper - value) else upper)
+
 class DS1054Z:
     '''Interface to Rigol DS1054Z oscilloscope.'''
 
-    timebases = [
+    timebases = numpy.array([
         2e-9, 5e-9,
         1e-8, 2e-8, 5e-8,
         1e-7, 2e-7, 5e-7,
@@ -26,15 +77,15 @@ class DS1054Z:
         1e-1, 2e-1, 5e-1,
         1e-0, 2e-0, 5e-0,
         1e+1, 2e+1, 5e+1
-    ]
+    ])
 
-    vertical_scales = [
+    vertical_scales = numpy.array([
         1e-2, 2e-2, 5e-2,
         1e-1, 2e-1, 5e-1,
         1e-0, 2e-0, 5e-0,
         1e+1, 2e+1, 5e+1,
         1e+2
-    ]
+    ])
 
     def __init__(self, path = "TCPIP::scope::5555::SOCKET"):
         self.path = path
@@ -49,7 +100,14 @@ class DS1054Z:
         # NOTE: For fastest data transfer from DS1054Z, use ::SOCKET connection mode
         # and TCPIP_NODELAY.
         # See https://www.eevblog.com/forum/testgear/download-speed-from-rigol-ds1054z-or-similar-oscilloscope-to-a-pc/25/
-        port.visalib.sessions[port.session]._set_tcpip_nodelay(constants.VI_ATTR_TCPIP_NODELAY, True)
+        session = port.visalib.sessions[port.session]
+        session._set_tcpip_nodelay(constants.VI_ATTR_TCPIP_NODELAY, True)
+
+        # Large reads for waveform data, so that a full WAV:DATA? block
+        # is received with only a few recv() calls.
+        port.chunk_size = 1024 * 1024
+        session.interface.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        session.interface.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
         
         idn_response = port.query("*IDN?")
         if 'RIGOL' not in idn_response:
@@ -57,23 +115,41 @@ class DS1054Z:
         
         return port
     
+    def _write_many(self, *cmds):
+        '''Send multiple SCPI commands in a single write.
+        Each command is given as absolute path, e.g. "CHAN1:COUP AC".'''
+        self.port.write(';:'.join(cmds))
+
+    def _query_scaling(self):
+        '''Query waveform Y-axis scale, origin and reference in a single transaction.'''
+        sample_scale, sample_offset, sample_ref = self.port.query("WAV:YINC?;:WAV:YOR?;:WAV:YREF?").split(';')
+        return float(sample_scale), float(sample_offset), float(sample_ref)
+
+    def _scale_samples(self, data, sample_scale, sample_offset, sample_ref):
+        '''Convert raw byte samples to volts in a single float32 buffer.'''
+        result = data.astype(numpy.float32)
+        result *= sample_scale
+        result -= (sample_ref + sample_offset) * sample_scale
+        return result
+
     def set_timebase(self, timebase, round = True):
         if round:
-            timebase = min(self.timebases, key = lambda x: abs(x - timebase))
+            timebase = _nearest(self.timebases, timebase)
 
         self.port.write("TIM:SCAL %s" % timebase)
     
     def config_channel(self, channel, scale, ac_mode = False, probe_scale = 10, bwlimit = False, display = True):
         channel = int(channel)
-        self.port.write("CHAN%d:COUP %s" % (channel, 'AC' if ac_mode else 'DC'))
-        self.port.write("CHAN%d:DISP %s" % (channel, 'ON' if display else 'OFF'))
-        self.port.write("CHAN%d:PROB %d" % (channel, probe_scale))
-        self.port.write("CHAN%d:BWLIMIT %s" % (channel, '20M' if bwlimit else 'OFF'))
-        self.port.write("CHAN%d:SCAL %s" % (channel, scale))
+        self._write_many(
+            "CHAN%d:COUP %s" % (channel, 'AC' if ac_mode else 'DC'),
+            "CHAN%d:DISP %s" % (channel, 'ON' if display else 'OFF'),
+            "CHAN%d:PROB %d" % (channel, probe_scale),
+            "CHAN%d:BWLIMIT %s" % (channel, '20M' if bwlimit else 'OFF'),
+            "CHAN%d:SCAL %s" % (channel, scale))
     
     def set_channel_scale(self, channel, scale, round = True):
         if round:
-            scale = min(self.vertical_scales, key = lambda x: abs(x - scale))
+            scale = _nearest(self.vertical_scales, scale)
 
         self.port.write("CHAN%d:SCAL %s" % (channel, scale))
 
@@ -110,18 +186,17 @@ class DS1054Z:
 
     def acquire_average(self, averages = 128):
         '''Set scope to averaging acquire mode.'''
-        self.port.write("ACQ:TYPE AVER")
-        self.port.write("ACQ:AVER %d" % int(averages))
+        self._write_many("ACQ:TYPE AVER", "ACQ:AVER %d" % int(averages))
 
     def set_trigger_rising(self, channel, level):
-        self.port.write("TRIG:EDGE:SOUR CHAN%d" % int(channel))
-        self.port.write("TRIG:EDGE:SLOP POS")
-        self.port.write("TRIG:EDGE:LEV %f" % float(level))
+        self._write_many("TRIG:EDGE:SOUR CHAN%d" % int(channel),
+                         "TRIG:EDGE:SLOP POS",
+                         "TRIG:EDGE:LEV %f" % float(level))
 
     def set_trigger_falling(self, channel, level):
-        self.port.write("TRIG:EDGE:SOUR CHAN%d" % int(channel))
-        self.port.write("TRIG:EDGE:SLOP NEG")
-        self.port.write("TRIG:EDGE:LEV %f" % float(level))
+        self._write_many("TRIG:EDGE:SOUR CHAN%d" % int(channel),
+                         "TRIG:EDGE:SLOP NEG",
+                         "TRIG:EDGE:LEV %f" % float(level))
 
     def measure(self, channel, parameter):
         '''Measure parameter of channel.
@@ -143,8 +218,7 @@ class DS1054Z:
 
     def screenshot(self):
         '''Take a screenshot.'''
-        data = self.port.query_binary_values("DISP:DATA? ON,OFF,PNG", datatype = 'B')
-        data = bytes(data)
+        data = self.port.query_binary_values("DISP:DATA? ON,OFF,PNG", datatype = 's', container = bytes)
         #data = self.port.read_raw()
         #open('data', 'wb').write(bytes(data))
 #        offset, datalen = visa.util.parse_ieee_block_header(data)
@@ -162,53 +236,65 @@ class DS1054Z:
         '''Return sample interval in seconds'''
         return float(self.port.query("WAV:XINC?"))
 
-    def fetch_data(self, channel):
-        '''Fetch waveform data from scope to buffer (uses screen buffer).'''
-        self.port.write("WAV:SOUR CHAN%d" % int(channel))
-        self.port.write("WAV:MODE NORM")
-        self.port.write("WAV:FORM BYTE")
-        self.port.write("WAV:STAR 1")
-        self.port.write("WAV:STOP 1200")
-        sample_scale = float(self.port.query("WAV:YINC?"))
-        sample_offset = float(self.port.query("WAV:YOR?"))
-        sample_ref = float(self.port.query("WAV:YREF?"))
-        data = self.port.query_binary_values("WAV:DATA?", datatype='B')
-        return (numpy.array(data) - sample_ref - sample_offset) * sample_scale
-
-    def fetch_data_raw(self, channel, start = 1, end = None):
-        '''Fetch waveform data from the full capture buffer. Stops capture.'''
-        self.port.write("STOP")
-        self.port.write("WAV:SOUR CHAN%d" % int(channel))
-        self.port.write("WAV:MODE RAW")
-        self.port.write("WAV:FORM BYTE")
-        sample_scale = float(self.port.query("WAV:YINC?"))
-        sample_offset = float(self.port.query("WAV:YOR?"))
-        sample_ref = float(self.port.query("WAV:YREF?"))
+    def fetch_data(self, channel, raw = False):
+        '''Fetch waveform data from scope to buffer (uses screen buffer).
+        If raw is True, returns tuple of (uint8 samples, scale, offset) where
+        volts = (samples - offset) * scale.'''
+        self._write_many("WAV:SOUR CHAN%d" % int(channel),
+                         "WAV:MODE NORM",
+                         "WAV:FORM BYTE",
+                         "WAV:STAR 1",
+                         "WAV:STOP 1200")
+        sample_scale, sample_offset, sample_ref = self._query_scaling()
+        data = self.port.query_binary_values("WAV:DATA?", datatype='B', container = numpy.array)
+
+        if raw:
+            return data, sample_scale, sample_ref + sample_offset
+
+        return self._scale_samples(data, sample_scale, sample_offset, sample_ref)
+
+    def fetch_data_raw(self, channel, start = 1, end = None, raw = False):
+        '''Fetch waveform data from the full capture buffer. Stops capture.
+        If raw is True, returns tuple of (uint8 samples, scale, offset) where
+        volts = (samples - offset) * scale.'''
+        self._write_many("STOP",
+                         "WAV:SOUR CHAN%d" % int(channel),
+                         "WAV:MODE RAW",
+                         "WAV:FORM BYTE")
+        sample_scale, sample_offset, sample_ref = self._query_scaling()
         
         if end is None:
             end = int(self.port.query("ACQ:MDEPTH?"))
         
-        alldata = []
-        
         start = int(start)
         end = int(end)
         maxblocklen = 250000
-        for blockstart in range(start, end, maxblocklen):
-            self.port.write("WAV:START %d" % blockstart)
-            self.port.write("WAV:STOP %d" % min(blockstart + maxblocklen, end))
-            block = self.port.query_binary_values("WAV:DATA?", datatype='B')
-            alldata += block
+        blockstarts = range(start, end, maxblocklen)
+
+        # Each block includes both its start and stop points
+        alldata = numpy.empty(end - start + len(blockstarts), dtype = numpy.uint8)
+        count = 0
+        for blockstart in blockstarts:
+            self._write_many("WAV:STAR %d" % blockstart,
+                             "WAV:STOP %d" % min(blockstart + maxblocklen, end))
+            block = self.port.query_binary_values("WAV:DATA?", datatype='B', container = numpy.array)
+            alldata[count:count + len(block)] = block
+            count += len(block)
+        alldata = alldata[:count]
+
+        if raw:
+            return alldata, sample_scale, sample_ref + sample_offset
 
-        return (numpy.array(alldata) - sample_ref - sample_offset) * sample_scale
+        return self._scale_samples(alldata, sample_scale, sample_offset, sample_ref)
 
     def dft_at_freq(self, channel, freq, use_raw = False):
         '''Calculate amplitude and phase at given frequency from
         data fetched from screen buffer or raw buffer.'''
 
         if use_raw:
-            data = self.fetch_data_raw(channel)
+            data, sample_scale, sample_offset = self.fetch_data_raw(channel, raw = True)
         else:
-            data = self.fetch_data(channel)
+            data, sample_scale, sample_offset = self.fetch_data(channel, raw = True)
 
         freq = float(freq)
         sample_interval = self.sample_interval()
@@ -223,8 +309,9 @@ class DS1054Z:
         if periods < 1:
             raise Exception("DS1054Z too small timestep %g for freq %f" % (sample_interval, freq))
 
-        exp = numpy.exp(math.tau * 1j * numpy.linspace(0, periods, samples, endpoint = False))
-        dft = numpy.sum(numpy.multiply(exp, data[:samples])) / samples
+        # The offset does not contribute to the DFT over whole periods,
+        # so only the scale needs to be applied.
+        dft = _dft_bin(data[:samples], periods) * sample_scale / samples
 
         amplitude = 4 * abs(dft) # Convert to Vpp reading
         phase = numpy.degrees(cmath.phase(dft))
@@ -43,10 +43,15 @@ class ET5410:
         self.port.write("CH:SW OFF")
     
     def measure_voltage(self):
-        return float(self.port.query("MEAS:VOLT?").strip("R"))
+        return float(self.port.query("MEAS:VOLT?").rstrip("R"))
     
     def measure_current(self):
-        return float(self.port.query("MEAS:CURR?").strip("R"))
+        return float(self.port.query("MEAS:CURR?").rstrip("R"))
+
+    def measure(self):
+        '''Measure voltage and current in a single query, returns (V, A)'''
+        voltage, current = self.port.query("MEAS:VOLT?;:MEAS:CURR?").split(';')
+        return float(voltage.rstrip("R")), float(current.rstrip("R"))
 
     def unlock(self):
         self.port.query("SYST:LOCA")
@@ -54,6 +59,6 @@ class ET5410:
 if __name__ == '__main__':
     p = ET5410()
     while True:
-        print("%6.3f V, %6.3f A" % (p.measure_voltage(), p.measure_current()))
+        print("%6.3f V, %6.3f A" % p.measure())
         p.unlock()
         time.sleep(1)
@@ -26,11 +26,16 @@ class P2Pro:
         ( 120, 200,   0, 255)  # Purple
     ]
     
+    # Temperature resolution of the color lookup table
+    lut_step = 0.1
+    
     def __init__(self, device = "/dev/instruments/P2Pro"):
         self.device = device
         self.palette = np.array(P2Pro.default_palette)
+        self._lut_palette = None
         
         self.fontprops = font_manager.FontProperties(family='sans serif')
+        self.fonts = {}
     
     @functools.cached_property
     def video(self):
@@ -39,6 +44,40 @@ class P2Pro:
         video.set(cv2.CAP_PROP_CONVERT_RGB, 0.0)
         return video
     
+    @functools.cached_property
+    def fontpath(self):
+        '''Look up font file on first access'''
+        return font_manager.findfont(self.fontprops)
+    
+    def font(self, size):
+        '''Load font of given size, reusing previously loaded fonts'''
+        if size not in self.fonts:
+            self.fonts[size] = PIL.ImageFont.truetype(self.fontpath, size)
+        return self.fonts[size]
+    
+    @property
+    def lut(self):
+        '''Color lookup table for the palette, rebuilt when the palette changes.
+        One RGB entry per lut_step degrees from the lowest to the highest palette temperature.
+        '''
+        if self._lut_palette is None or not np.array_equal(self._lut_palette, self.palette):
+            mintemp = float(np.min(self.palette[:,0]))
+            maxtemp = float(np.max(self.palette[:,0]))
+            temps = np.arange(round((maxtemp - mintemp) / self.lut_step) + 1) * self.lut_step + mintemp
+            r = np.interp(temps, self.palette[:,0], self.palette[:,1])
+            g = np.interp(temps, self.palette[:,0], self.palette[:,2])
+            b = np.interp(temps, self.palette[:,0], self.palette[:,3])
+            self._lut = np.stack((r,g,b), axis = 1).astype(np.uint8)
+            self._lut_mintemp = mintemp
+            self._lut_palette = self.palette.copy()
+        return self._lut
+    
+    def lut_index(self, temperatures):
+        '''Convert temperature values to indexes into lut'''
+        lut = self.lut
+        idx = ((temperatures - self._lut_mintemp) * (1 / self.lut_step) + 0.5).astype(np.int32)
+        return np.clip(idx, 0, len(lut) - 1)
+    
     def capture(self):
         '''Capture frame and return as numpy array of temperatures'''
 
@@ -52,18 +91,17 @@ class P2Pro:
         # The lower half of the image contains 16-bit temperature readings
         # Convert to Celsius scale
         image, thermal = np.array_split(frame, 2)
-        temperatures = thermal[:,:,0].astype('float') + thermal[:,:,1].astype('float') * 256
-        temperatures = (temperatures / 64) - 273.15
+        raw = np.ascontiguousarray(thermal).view('<u2')[:,:,0]
+        temperatures = raw.astype(np.float32)
+        temperatures *= 1 / 64
+        temperatures -= 273.15
         return temperatures
     
     def map_colors(self, temperatures):
         '''Perform color mapping for temperature values based on palette.
         Note: Uses absolute color scale instead of automatic scaling.
         '''
-        r = np.interp(temperatures, self.palette[:,0], self.palette[:,1])
-        g = np.interp(temperatures, self.palette[:,0], self.palette[:,2])
-        b = np.interp(temperatures, self.palette[:,0], self.palette[:,3])
-        rgb = np.stack((r,g,b), axis = 2).astype(np.uint8)
+        rgb = self.lut[self.lut_index(temperatures)]
         return PIL.Image.fromarray(rgb, 'RGB')
     
     def draw_scale(self, img, x, y, w, h):
@@ -72,14 +110,14 @@ class P2Pro:
         # Draw color scale
         mintemp = np.min(self.palette[:,0])
         maxtemp = np.max(self.palette[:,0])
-        temps = np.tile(np.linspace(maxtemp, mintemp, h), (w, 1)).transpose()
-        colors = self.map_colors(temps)
-        img.paste(colors, (x, y))
+        temps = np.linspace(maxtemp, mintemp, h)
+        rgb = self.lut[self.lut_index(temps)]
+        rgb = np.broadcast_to(rgb[:,None,:], (h, w, 3)).copy()
+        img.paste(PIL.Image.fromarray(rgb, 'RGB'), (x, y))
         
         # Draw texts
         draw = PIL.ImageDraw.Draw(img)
-        fontpath = font_manager.findfont(self.fontprops)
-        font = PIL.ImageFont.truetype(fontpath, 10)
+        font = self.font(10)
         for t, r, g, b in self.palette:
             ypos = h - (t - mintemp) / (maxtemp - mintemp) * h + y
             draw.line(((x + w, ypos), (x + w + 5, ypos)), (r,g,b), 1)
@@ -89,8 +127,7 @@ class P2Pro:
     def draw_point(self, img, x, y, text):
         '''Hilight point in image and add explanation text'''
         draw = PIL.ImageDraw.Draw(img)
-        fontpath = font_manager.findfont(self.fontprops)
-        font = PIL.ImageFont.truetype(fontpath, 12)
+        font = self.font(12)
 
         draw.ellipse((x-3,y-3,x+3,y+3), outline = (255,255,255))
         draw.line(((x+3, y), (x + 5, y)), (255,255,255), 1)
@@ -121,12 +158,14 @@ class P2Pro:
             self.draw_scale(img, w * 2 + 5, 10, 10, h * 2 - 20)
         
         if minpoint:
-            my, mx = np.unravel_index(np.argmin(temps), temps.shape)
-            self.draw_point(img, mx * 2, my * 2, "min %0.1f °C" % np.min(temps))
+            i = np.argmin(temps)
+            my, mx = np.unravel_index(i, temps.shape)
+            self.draw_point(img, mx * 2, my * 2, "min %0.1f °C" % temps[my,mx])
         
         if maxpoint:
-            my, mx = np.unravel_index(np.argmax(temps), temps.shape)
-            self.draw_point(img, mx * 2, my * 2, "max %0.1f °C" % np.max(temps))
+            i = np.argmax(temps)
+            my, mx = np.unravel_index(i, temps.shape)
+            self.draw_point(img, mx * 2, my * 2, "max %0.1f °C" % temps[my,mx])
         
         if midpoint:
             mx = w // 2
@@ -54,8 +54,13 @@ class P4603:
     def measure_current(self):
         return float(self.port.query("MEAS:CURR?"))
 
+    def measure(self):
+        '''Measure voltage and current in a single query, returns (V, A)'''
+        voltage, current = self.port.query("MEAS:VOLT?;:MEAS:CURR?").split(';')
+        return float(voltage), float(current)
+
 if __name__ == '__main__':
     p = P4603()
     while True:
-        print("%6.3f V, %6.3f A" % (p.measure_voltage(), p.measure_current()))
+        print("%6.3f V, %6.3f A" % p.measure())
         time.sleep(1)
@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
 import PIL.Image
-import struct
 import serial
 import functools
 import math
@@ -44,11 +43,18 @@ class TinySA:
         self.port.flushInput()
         self.port.write(cmd + b"\r\n")
         self.port.readline() # Discard command echo
+        
+        # Read whatever is available in one go instead of line by line,
+        # and stop as soon as the prompt arrives instead of waiting for timeout.
         data = b''
-        for line in self.port:
-            if line.startswith(b'ch>'):
-                break
-            data += line
+        while not data.endswith(b'ch> '):
+            piece = self.port.read(self.port.in_waiting or 1)
+            if not piece: break
+            data += piece
+        
+        prompt = data.rfind(b'ch>')
+        if prompt >= 0:
+            data = data[:prompt]
         return data
     
     def screenshot(self):
@@ -58,16 +64,17 @@ class TinySA:
         self.port.readline()
 
         totallen = self.screenwidth * self.screenheight * 2
-        data = b''
-        while len(data) < totallen:
-            piece = self.port.read(totallen - len(data))
-            if not piece: raise Exception("Timeout while reading screenshot, after %d bytes" % len(data))
-            data += piece
+        data = bytearray(totallen)
+        view = memoryview(data)
+        offset = 0
+        while offset < totallen:
+            count = self.port.readinto(view[offset:])
+            if not count: raise Exception("Timeout while reading screenshot, after %d bytes" % offset)
+            offset += count
         
         # Convert from RGB565
-        pixels = list(struct.iter_unpack(">H", data))
-        a = np.array(pixels, dtype = np.uint32)
-        a = 0xFF000000 + ((a & 0xF800) >> 8) + ((a & 0x07E0) << 5) + ((a & 0x001F) << 19)
+        a = np.frombuffer(data, dtype = '>u2').astype(np.uint32)
+        a = 0xFF000000 | ((a & 0xF800) >> 8) | ((a & 0x07E0) << 5) | ((a & 0x001F) << 19)
         return PIL.Image.frombuffer('RGBA', (self.screenwidth, self.screenheight), a, 'raw', 'RGBA', 0, 1)
 
     def scan(self, start = 1e6, stop = 100e6, rbw = 850e3, step = 0.5, logscale = False):
@@ -82,7 +89,7 @@ class TinySA:
         
         step = step * rbw
         points = math.ceil((stop - start) / step)
-        results = np.zeros((0, 2))
+        segments = []
         
         if logscale:
             freqs = np.logspace(math.log10(start), math.log10(stop), points)
@@ -94,10 +101,12 @@ class TinySA:
             freqseg = freqs[i:i + segment_len]
             
             data = self.run_cmd('scan %d %d %d 3' % (freqseg[0], freqseg[-1], len(freqseg)))
-            data = np.genfromtxt(data.decode('ascii').split('\n'))
-            results = np.vstack((results, data[:,:2]))
+            text = data.decode('ascii').strip()
+            columns = len(text.split('\n', 1)[0].split())
+            data = np.fromstring(text, sep = ' ').reshape(-1, columns)
+            segments.append(data[:,:2])
         
-        return results
+        return np.concatenate(segments, axis = 0)
 
 if __name__ == '__main__':
     argparser = argparse.ArgumentParser(description = "Utility for TinySA spectrum analyzer")
@@ -3,11 +3,15 @@
 from labtools import instruments
 import numpy as np
 import math
-import sigfig
 import click
 import pandas
 import time
 
+def max_amplitude(channel):
+    '''Return maximum absolute voltage of scope screen buffer.'''
+    data, scale, offset = instruments.scope.fetch_data(channel, raw = True)
+    return max(abs(int(data.max()) - offset), abs(int(data.min()) - offset)) * scale
+
 def measure_response(freq, delay = 1.0, autorange = False, memdepth = 120000):
     '''Default measurement callback, returns amplitude and phase.
     Uses channel 1 as measurement channel and channel 2 as reference channel.'''
@@ -23,8 +27,8 @@ def measure_response(freq, delay = 1.0, autorange = False, memdepth = 120000):
         instruments.scope.force_trigger()
         time.sleep(delay)
         instruments.scope.stop()
-        a1 = np.max(np.abs(instruments.scope.fetch_data(1)))
-        a2 = np.max(np.abs(instruments.scope.fetch_data(2)))
+        a1 = max_amplitude(1)
+        a2 = max_amplitude(2)
         instruments.scope.set_channel_scale(1, a1 / 4.0)
         instruments.scope.set_channel_scale(2, a2 / 4.0)
         instruments.scope.run()
@@ -48,10 +52,15 @@ def freqresp_iter(freq_min = 100.0, freq_max = 100.0e3, log_stepsdec = 10,
         freqs = np.arange(freq_min, freq_max, lin_interval)
     else:
         sigfigs = math.ceil(log_stepsdec / 10 + 1)
-        base = 10**(1.0 / log_stepsdec)
-        steps = math.ceil(math.log(freq_max / freq_min) / math.log(base))
-        first = math.log(freq_min) / math.log(base)
-        freqs = [sigfig.round(base ** (first + x), sigfigs=sigfigs) for x in range(steps + 1)]
+        steps = math.ceil(math.log10(freq_max / freq_min) * log_stepsdec)
+        freqs = freq_min * 10 ** (np.arange(steps + 1) / log_stepsdec)
+
+        # Round to significant figures. Only integer powers of ten are used
+        # as divisors/multipliers, as those are exact in floating point.
+        k = np.floor(np.log10(freqs)) - (sigfigs - 1)
+        up = 10.0 ** np.maximum(k, 0)
+        down = 10.0 ** np.maximum(-k, 0)
+        freqs = np.round(freqs / up * down) / down * up
 
     results = []
 
@@ -76,22 +85,28 @@ def freqresp(freq_min = 100.0, freq_max = 100.0e3, log_stepsdec = 10,
     if ipython:
         fig = plt.figure()
         ax = fig.add_axes([0.2,0.2,0.8,0.6])
+        line_dB, = ax.plot([], [], label = 'dB')
+        line_phase, = ax.plot([], [], label = 'phase')
+        ax.set_xlabel('Frequency (Hz)', labelpad = 15)
+        ax.grid()
+        ax.legend(loc='upper right', bbox_to_anchor=(1, 1.2))
+        freqs, dBs, phases = [], [], []
 
     data = []
     for row in freqresp_iter(freq_min, freq_max, log_stepsdec, lin_interval, measure, delay = delay, autorange = autorange, **kwargs):
         data.append(row)
 
         if ipython:
-            r = pandas.DataFrame(data)
+            # Update existing plot lines with the new point
+            freqs.append(row['freq'])
+            dBs.append(row['dB'])
+            phases.append(row['phase'])
+            line_dB.set_data(freqs, dBs)
+            line_phase.set_data(freqs, phases)
+            ax.relim()
+            ax.autoscale_view()
             clear_output(wait = True)
-            ax.clear()
-            ax.plot(list(r['freq']), list(r['dB']), label = 'dB')
-            ax.plot(list(r['freq']), list(r['phase']), label = 'phase')
-            ax.set_xlabel('Frequency (Hz)', labelpad = 15)
-            ax.grid()
-            ax.legend(loc='upper right', bbox_to_anchor=(1, 1.2))
             display(fig)
-            display(r)
 
     r = pandas.DataFrame(data)
 